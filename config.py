@@ -4,6 +4,13 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 TOKEN_PATH = os.path.join(SCRIPT_DIR, "token.json")
 CLIENT_SECRETS_PATH = os.path.join(SCRIPT_DIR, "desktop_client_secrets.json")
 
+# Time zone applied to the start/end times of events created by the server
+CALENDAR_TIMEZONE = "Europe/Rome"
+
+# Optional directory for an on-disk HTTP cache of Google API responses (ETag revalidation).
+# Off by default: the cache stores response bodies, email contents included, unencrypted on disk.
+HTTP_CACHE_PATH = os.getenv("GSUITE_MCP_HTTP_CACHE")
+
 # --- IMPORTANT --- After updating this, you MUST delete your old token.json and re-run get_credentials.py
 SCOPES = [
     'https://www.googleapis.com/auth/gmail.readonly',
@@ -1,29 +1,84 @@
 # mcp_server.py
-import base64
+import asyncio
+import binascii
+import functools
 import os
+import re
 import sys
-from typing import Dict, Any, AsyncIterator, Optional, List
+import threading
+import urllib.request
+from typing import Annotated, Dict, Any, AsyncIterator, Callable, Optional, List, Set, Tuple, Union
 from contextlib import asynccontextmanager
-import io
-from email.message import EmailMessage
+from email.message import EmailMessage, Message
+from datetime import datetime, timedelta, timezone
 
 import google.oauth2.credentials
+import httplib2
+import orjson
 import googleapiclient.discovery
+from cachetools import TTLCache
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery_cache import get_static_doc
 from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaIoBaseUpload
+from googleapiclient.model import JsonModel
+from googleapiclient.http import BatchHttpRequest, HttpRequest, MediaInMemoryUpload, build_http
 
 from mcp.server.fastmcp import FastMCP, Context
-from pydantic import BaseModel, Field
+from pydantic import AfterValidator, BaseModel, Field
 
-from config import TOKEN_PATH, SCOPES
+from config import TOKEN_PATH, SCOPES, CALENDAR_TIMEZONE, HTTP_CACHE_PATH
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+thread_local = threading.local()  # Per-worker-thread state, see get_thread_http()
+# (snippet, body) of recently read messages, keyed by message id. A message's content never changes,
+# so the only staleness is a message deleted within the TTL still being served from the cache.
+MESSAGE_CACHE: TTLCache = TTLCache(maxsize=2048, ttl=300)
+DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/{api}/{version}/rest"
+GOOGLE_APIS = (('gmail', 'v1'), ('calendar', 'v3'), ('drive', 'v3'))
+DEFAULT_EVENT_DESCRIPTION = "Created from an email automation."
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)  # How long before expiry the access token is refreshed
+TOKEN_REFRESH_RETRY_DELAY = timedelta(minutes=1)  # Wait after a failed refresh, or when the expiry is unknown
+FROM_ADDRESS_RE = re.compile(r'<([^>]+)>')  # The address in a 'Name <address>' From header
+URLSAFE_TRANS = str.maketrans('-_', '+/')  # base64url alphabet to standard base64, see decode_base64url()
+# An RFC 3339 date-time, as the Calendar API accepts for dateTime; the offset may be left to CALENDAR_TIMEZONE.
+RFC3339_DATETIME_RE = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d+)?(Z|[+-]\d{2}:\d{2})?')
+GMAIL_LIST_PAGE_SIZE = 500  # Max message ids returned by a single messages().list call
+GMAIL_BATCH_DELETE_LIMIT = 1000  # Max message ids accepted by a single messages().batchDelete call
+RESUMABLE_UPLOAD_THRESHOLD = 5 * 1024 * 1024  # Drive uploads from this size (bytes) on use the resumable protocol
+MAX_CONCURRENT_SENDERS = 8  # Senders purged in parallel by batch_delete_emails_from_senders
+# Calls per batch HTTP request. The hard limit is 100, but Google advises against going over 50
+# since larger batches are likely to trip per-user rate limits.
+GOOGLE_BATCH_LIMIT = 50
+# Partial-response mask for messages().get(): only the fields get_email_body() walks, a few MIME levels deep.
+# Headers are kept for the charset in Content-Type; attachment data and everything else format='full'
+# would send are skipped.
+MESSAGE_PART_FIELDS = "mimeType,headers(name,value),body/data"
+MESSAGE_BODY_FIELDS = (
+    "id,snippet,"
+    f"payload({MESSAGE_PART_FIELDS},parts({MESSAGE_PART_FIELDS},parts({MESSAGE_PART_FIELDS},"
+    f"parts({MESSAGE_PART_FIELDS},parts({MESSAGE_PART_FIELDS})))))"
+)
+
+def validate_iso_datetime(value: str) -> str:
+    """Rejects start/end times that are not RFC 3339 date-times before they reach the Calendar API."""
+    match = RFC3339_DATETIME_RE.fullmatch(value)
+    if match is None:
+        raise ValueError(f"'{value}' is not an RFC 3339 date-time such as '2025-07-05T15:00:00'")
+    # The pattern only checks the shape: strptime catches out-of-range fields like month 13.
+    # Unlike fromisoformat(), it behaves the same on every supported Python version.
+    datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S')
+    offset = match.group(2)
+    if offset and offset != 'Z':
+        datetime.strptime(offset[1:], '%H:%M')
+    return value
+
+DateTimeStr = Annotated[str, AfterValidator(validate_iso_datetime)]
 
 class EventDetails(BaseModel):
     summary: str = Field(description="The title or summary of the calendar event.")
-    start_time: str = Field(description="The start time of the event in ISO 8601 format (e.g., '2025-07-05T15:00:00').")
-    end_time: str = Field(description="The end time of the event in ISO 8601 format (e.g., '2025-07-05T16:00:00').")
+    start_time: DateTimeStr = Field(description="The start time of the event in ISO 8601 format (e.g., '2025-07-05T15:00:00').")
+    end_time: DateTimeStr = Field(description="The end time of the event in ISO 8601 format (e.g., '2025-07-05T16:00:00').")
     description: Optional[str] = Field(None, description="A detailed description for the event. Can include notes from the source email.")
 
 """
@@ -34,8 +89,8 @@ it wants to change, making the tool much more flexible and easier to use.
 """
 class EventUpdateDetails(BaseModel):
     summary: Optional[str] = Field(None, description="The new title for the event.")
-    start_time: Optional[str] = Field(None, description="The new start time in ISO 8601 format.")
-    end_time: Optional[str] = Field(None, description="The new end time in ISO 8601 format.")
+    start_time: Optional[DateTimeStr] = Field(None, description="The new start time in ISO 8601 format.")
+    end_time: Optional[DateTimeStr] = Field(None, description="The new end time in ISO 8601 format.")
     description: Optional[str] = Field(None, description="The new description for the event.")
 
 class EmailContent(BaseModel):
@@ -57,17 +112,43 @@ class ListedDriveFile(BaseModel):
 
 # --- Lifespan Management for Credentials ---
 
+def save_credentials(creds: google.oauth2.credentials.Credentials) -> None:
+    """Re-saves the (refreshed) token so the next server start picks it up."""
+    with open(TOKEN_PATH, 'w') as token_file:
+        token_file.write(creds.to_json())
+
+async def refresh_credentials_periodically(creds: google.oauth2.credentials.Credentials) -> None:
+    """
+    Refreshes the access token TOKEN_REFRESH_MARGIN before it expires, forever. Access tokens last
+    about an hour, so without this a long-running server starts failing every tool call mid-session.
+    Regular refreshes also keep the refresh token in use, so Google doesn't revoke it as inactive.
+    """
+    while True:
+        delay = TOKEN_REFRESH_RETRY_DELAY.total_seconds()
+        if creds.expiry:
+            # google-auth keeps expiry as a naive UTC datetime
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            delay = (creds.expiry - TOKEN_REFRESH_MARGIN - now).total_seconds()
+        await asyncio.sleep(max(delay, 0))
+        try:
+            await asyncio.to_thread(creds.refresh, Request())
+            save_credentials(creds)
+            print("Token refreshed and saved.", file=sys.stderr)
+        except Exception as e:
+            print(f"ERROR: Failed to refresh token: {e}", file=sys.stderr)
+            await asyncio.sleep(TOKEN_REFRESH_RETRY_DELAY.total_seconds())
+
 @asynccontextmanager
 async def credential_manager(server: FastMCP) -> AsyncIterator[Dict[str, Any]]:
     """
-    Manages loading and refreshing Google API credentials on server startup.
+    Manages loading Google API credentials on server startup and keeping them refreshed while it runs.
     """
     creds = None
     if not os.path.exists(TOKEN_PATH):
         print(f"ERROR: Token file '{TOKEN_PATH}' not found.", file=sys.stderr)
         print("Please run 'python get_credentials.py' first to authorize the application.", file=sys.stderr)
         # Yield an empty context and let tool calls fail gracefully
-        yield {"creds": None}
+        yield {"creds": None, "http": None, "services": {}}
         return
 
     print(f"Loading credentials from {TOKEN_PATH}", file=sys.stderr)
@@ -77,16 +158,32 @@ async def credential_manager(server: FastMCP) -> AsyncIterator[Dict[str, Any]]:
         print("Credentials expired. Refreshing...", file=sys.stderr)
         try:
             creds.refresh(Request())
-            # Re-save the refreshed token
-            with open(TOKEN_PATH, 'w') as token_file:
-                token_file.write(creds.to_json())
+            save_credentials(creds)
             print("Token refreshed and saved.", file=sys.stderr)
         except Exception as e:
             print(f"ERROR: Failed to refresh token: {e}", file=sys.stderr)
             creds = None # Mark credentials as invalid
             
-    # Make credentials available to all tool handlers via context
-    yield {"creds": creds}
+    # One authorized transport shared by every service. Requests built from them are executed
+    # on per-thread copies of it (see execute()), since httplib2 isn't thread-safe.
+    authorized_http = AuthorizedHttp(creds, http=build_transport()) if creds else None
+
+    # Build every service once at startup; tool calls fetch them through get_service()
+    services = {}
+    if authorized_http:
+        services = {(api, version): build_service(api, version, authorized_http) for api, version in GOOGLE_APIS}
+
+    # Keep the access token fresh for as long as the server runs, not just at startup
+    refresh_task = None
+    if creds and creds.refresh_token:
+        refresh_task = asyncio.create_task(refresh_credentials_periodically(creds))
+
+    # Make credentials and services available to all tool handlers via context
+    try:
+        yield {"creds": creds, "http": authorized_http, "services": services}
+    finally:
+        if refresh_task:
+            refresh_task.cancel()
     print("Server shutting down.", file=sys.stderr)
 
 # Initialize the server with the lifespan manager
@@ -106,99 +203,293 @@ def get_creds_from_context(ctx: Context) -> google.oauth2.credentials.Credential
         )
     return creds
 
+def get_service(ctx: Context, api: str, version: str) -> Any:
+    """
+    Returns the service object for a Google API from the lifespan context.
+    Services are built at startup; any API not built there is built on first use and cached.
+    """
+    get_creds_from_context(ctx)  # Fails early if the credentials are missing or invalid
+    lifespan_context = ctx.request_context.lifespan_context
+    services = lifespan_context["services"]
+    if (api, version) not in services:
+        services[(api, version)] = build_service(api, version, lifespan_context["http"])
+    return services[(api, version)]
+
+@functools.lru_cache(maxsize=8)
+def load_discovery_doc(api: str, version: str) -> str:
+    """
+    Returns the discovery document of a Google API, loading it only once per process.
+    The document is the same for every user, so only the document is cached, not the
+    service object (which is bound to the credentials).
+    """
+    doc = get_static_doc(api, version)
+    if doc is None:
+        # Not bundled with googleapiclient: fetch it from the Discovery Service once.
+        with urllib.request.urlopen(DISCOVERY_URL.format(api=api, version=version), timeout=30) as response:
+            doc = response.read().decode('utf-8')
+    return doc
+
+class OrjsonModel(JsonModel):
+    """
+    JsonModel that parses response bodies with orjson instead of the stdlib json module.
+    Response parsing is the main CPU cost of reading large messages; request bodies are small
+    and keep the stdlib serializer.
+    """
+
+    def deserialize(self, content: Union[bytes, str]) -> Any:
+        try:
+            body = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # Not JSON: let the base class hand the raw content back, as it always has
+            return super().deserialize(content)
+        if self._data_wrapper and isinstance(body, dict) and "data" in body:
+            body = body["data"]
+        return body
+
+def build_service(api: str, version: str, http: AuthorizedHttp) -> Any:
+    """Builds a Google API service object from the cached discovery document, on an authorized transport."""
+    return googleapiclient.discovery.build_from_document(load_discovery_doc(api, version), http=http, model=OrjsonModel())
+
+# Pre-warm the discovery cache so the first tool call doesn't pay for it.
+for _api, _version in GOOGLE_APIS:
+    load_discovery_doc(_api, _version)
+
+def build_transport() -> httplib2.Http:
+    """
+    Creates the httplib2 transport that authorized requests run on. When HTTP_CACHE_PATH is set,
+    responses are cached there and revalidated with their ETag, so unchanged resources come back
+    as a bodiless 304 Not Modified.
+    """
+    http = build_http()
+    if HTTP_CACHE_PATH:
+        http.cache = httplib2.FileCache(HTTP_CACHE_PATH)
+    return http
+
+def get_thread_http(creds: google.oauth2.credentials.Credentials) -> AuthorizedHttp:
+    """
+    Returns the authorized transport of the current worker thread, creating it on first use.
+    httplib2 isn't thread-safe, so requests running in parallel threads can't share one transport;
+    each thread keeps its own and reuses its connections across tool calls.
+    """
+    http = getattr(thread_local, 'http', None)
+    if http is None or http.credentials is not creds:
+        http = thread_local.http = AuthorizedHttp(creds, http=build_transport())
+    return http
+
+def execute_on_thread_http(request: Union[HttpRequest, BatchHttpRequest], creds: google.oauth2.credentials.Credentials) -> Any:
+    """Executes a request on the calling thread's own transport. Must run in a worker thread."""
+    return request.execute(http=get_thread_http(creds))
+
+async def execute(request: HttpRequest) -> Any:
+    """Executes a prepared Google API request in a worker thread, so it doesn't block the event loop."""
+    return await asyncio.to_thread(execute_on_thread_http, request, request.http.credentials)
+
+async def execute_batch(service: Any, requests: List[HttpRequest], return_exceptions: bool = False) -> List[Any]:
+    """
+    Executes API requests through batch HTTP requests of up to GOOGLE_BATCH_LIMIT calls each,
+    so N calls cost ceil(N / GOOGLE_BATCH_LIMIT) round-trips. Responses keep the order of the requests.
+    A failed call raises its HttpError, unless return_exceptions is set: then the error takes its place
+    in the results, like asyncio.gather does.
+    """
+    responses = []
+    if not requests:
+        return responses
+
+    def collect(request_id: str, response: Any, exception: Optional[HttpError]) -> None:
+        if exception is not None and not return_exceptions:
+            raise exception
+        responses.append(exception if exception is not None else response)
+
+    creds = requests[0].http.credentials
+    for i in range(0, len(requests), GOOGLE_BATCH_LIMIT):
+        batch = service.new_batch_http_request(callback=collect)
+        for request in requests[i:i + GOOGLE_BATCH_LIMIT]:
+            batch.add(request)
+        await asyncio.to_thread(execute_on_thread_http, batch, creds)
+    return responses
+
+def text_media_upload(content: str) -> MediaInMemoryUpload:
+    """
+    Wraps document text for a Drive upload. Small payloads go up in one multipart request;
+    only content past RESUMABLE_UPLOAD_THRESHOLD pays for a resumable session's extra round-trip.
+    """
+    data = content.encode()
+    return MediaInMemoryUpload(data, mimetype='text/plain', resumable=len(data) >= RESUMABLE_UPLOAD_THRESHOLD)
+
+async def list_message_ids(gmail_service: Any, query: Optional[str] = None, total: Optional[int] = None) -> AsyncIterator[str]:
+    """
+    Yields the ids of the messages matching a Gmail search query, newest first, following
+    nextPageToken across pages of up to GMAIL_LIST_PAGE_SIZE ids until `total` ids have been yielded.
+    """
+    yielded = 0
+    page_token = None
+    while total is None or yielded < total:
+        page_size = GMAIL_LIST_PAGE_SIZE if total is None else min(GMAIL_LIST_PAGE_SIZE, total - yielded)
+        results = await execute(gmail_service.users().messages().list(
+            userId='me', q=query, maxResults=page_size, pageToken=page_token, fields='messages/id,nextPageToken'
+        ))
+        for msg_info in results.get('messages', []):
+            yield msg_info['id']
+            yielded += 1
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return
+
+def decode_base64url(data: str) -> bytes:
+    """
+    Decodes the unpadded base64url strings returned by the Gmail API. Feeds binascii directly
+    instead of going through base64.urlsafe_b64decode, which makes extra bytes copies first.
+    """
+    return binascii.a2b_base64(data.translate(URLSAFE_TRANS) + '=' * (-len(data) % 4))
+
+def get_part_charset(part: Dict[str, Any]) -> str:
+    """Returns the charset declared in a message part's Content-Type header, UTF-8 if there is none."""
+    headers = Message()
+    for header in part.get('headers') or ():
+        if header['name'].lower() == 'content-type':
+            headers['Content-Type'] = header['value']
+            break
+    return headers.get_content_charset('utf-8')
+
 def get_email_body(payload: Dict[str, Any]) -> Optional[str]:
-    """Recursively finds the 'text/plain' part of an email."""
-    if 'parts' in payload:
-        for part in payload['parts']:
-            if part['mimeType'] == 'text/plain' and 'data' in part['body']:
-                return base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-            # Recurse to check nested parts
-            body = get_email_body(part)
-            if body:
-                return body
-    elif payload.get('mimeType') == 'text/plain' and 'data' in payload.get('body', {}):
-        return base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8')
+    """
+    Finds the first 'text/plain' part of an email in document order and decodes it with the charset
+    the part declares. Walks the parts depth-first with an explicit stack, so deeply nested messages
+    can't hit the recursion limit.
+    """
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        if part.get('mimeType') == 'text/plain' and part.get('body', {}).get('data'):
+            data = decode_base64url(part['body']['data'])
+            try:
+                return data.decode(get_part_charset(part), 'replace')
+            except LookupError:
+                # Unknown charset: fall back to UTF-8
+                return data.decode('utf-8', 'replace')
+        stack.extend(reversed(part.get('parts') or ()))
     return None
 
+def cache_message(message: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+    """Parses a fetched message into its (snippet, plain text body) and stores it in MESSAGE_CACHE."""
+    entry = (message.get('snippet', ''), get_email_body(message['payload']))
+    MESSAGE_CACHE[message['id']] = entry
+    return entry
+
+def format_api_error(api_name: str, error: HttpError) -> str:
+    """Formats a Google API HttpError into the message shown to the client."""
+    return f"API {api_name} error (HTTP {error.status_code}): {error.reason}"
+
+def google_api_errors(api_name: str) -> Callable:
+    """
+    Decorator for tools calling a Google API: turns any HttpError the tool raises into a readable
+    'API <api_name> error' exception, so each tool doesn't repeat the same try/except.
+    """
+    def decorator(tool: Callable) -> Callable:
+        @functools.wraps(tool)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            try:
+                return await tool(*args, **kwargs)
+            except HttpError as e:
+                raise Exception(format_api_error(api_name, e))
+        return wrapper
+    return decorator
+
 # --- GMAIL TOOLS ---
 
 @server.tool()
-def read_latest_gmail_email(ctx: Context) -> Dict[str, str]:
+@google_api_errors('Gmail')
+async def read_latest_gmail_email(ctx: Context) -> Dict[str, str]:
     """Reads the most recent email from the user's Gmail inbox."""
-    creds = get_creds_from_context(ctx)
-    try:
-        gmail_service = googleapiclient.discovery.build('gmail', 'v1', credentials=creds)
-        messages_list = gmail_service.users().messages().list(userId='me', maxResults=1).execute()
-        
-        if not messages_list.get('messages'):
-            raise Exception("No emails found.")
-        
-        msg_id = messages_list['messages'][0]['id']
-        message = gmail_service.users().messages().get(userId='me', id=msg_id, format='full').execute()
-        
-        email_body = get_email_body(message['payload'])
-        if not email_body:
-            email_body = "Could not find the body in the last email."
-            # raise Exception("Could not find the body in the last email.")
-            
-        return {'snippet': message.get('snippet', ''), 'body': email_body}
-    except HttpError as e:
-        raise Exception(f"API Gmail error (HTTP {e.status_code}): {e.reason}")
+    gmail_service = get_service(ctx, 'gmail', 'v1')
+    # Only the id is needed to fetch the message; a batch can't chain the get on the list result.
+    messages_list = await execute(gmail_service.users().messages().list(userId='me', maxResults=1, fields='messages/id'))
+
+    if not messages_list.get('messages'):
+        raise Exception("No emails found.")
+
+    msg_id = messages_list['messages'][0]['id']
+    cached = MESSAGE_CACHE.get(msg_id)
+    if cached is None:
+        cached = cache_message(await execute(gmail_service.users().messages().get(userId='me', id=msg_id, format='full', fields=MESSAGE_BODY_FIELDS)))
+    snippet, email_body = cached
+
+    if not email_body:
+        email_body = "Could not find the body in the last email."
+        # raise Exception("Could not find the body in the last email.")
+
+    return {'snippet': snippet, 'body': email_body}
 
 @server.tool()
-def read_email_by_subject(subject: str, ctx: Context) -> List[Dict[str, str]]:
+@google_api_errors('Gmail')
+async def read_email_by_subject(subject: str, ctx: Context) -> List[Dict[str, str]]:
     """
     Searches for emails by subject and returns the body and snippet of the most recent matches.
     
     Args:
         subject: The subject line to search for.
     """
-    creds = get_creds_from_context(ctx)
-    try:
-        gmail_service = googleapiclient.discovery.build('gmail', 'v1', credentials=creds)
-        # Search for messages with the given subject, get the most recent 5
-        results = gmail_service.users().messages().list(userId='me', q=f'subject:"{subject}"', maxResults=5).execute()
-        messages = results.get('messages', [])
-
-        if not messages:
-            return [{"status": f"No emails found with subject: '{subject}'"}]
-
-        emails = []
-        for msg_info in messages:
-            msg = gmail_service.users().messages().get(userId='me', id=msg_info['id'], format='full').execute()
-            body = get_email_body(msg['payload']) or "Could not extract plain text body."
-            emails.append({'id': msg['id'], 'snippet': msg.get('snippet', ''), 'body': body})
-        return emails
-    except HttpError as e:
-        raise Exception(f"API Gmail error (HTTP {e.status_code}): {e.reason}")
+    gmail_service = get_service(ctx, 'gmail', 'v1')
+    # Search for messages with the given subject, get the most recent 5
+    results = await execute(gmail_service.users().messages().list(userId='me', q=f'subject:"{subject}"', maxResults=5, fields='messages/id'))
+    messages = results.get('messages', [])
+
+    if not messages:
+        return [{"status": f"No emails found with subject: '{subject}'"}]
+
+    # Fetch only the messages that aren't cached yet (e.g. on agent retries of the same search)
+    cached = {msg_info['id']: MESSAGE_CACHE.get(msg_info['id']) for msg_info in messages}
+    for msg in await execute_batch(gmail_service, [
+        gmail_service.users().messages().get(userId='me', id=msg_id, format='full', fields=MESSAGE_BODY_FIELDS)
+        for msg_id, entry in cached.items() if entry is None
+    ]):
+        cached[msg['id']] = cache_message(msg)
+
+    emails = []
+    for msg_id, (snippet, body) in cached.items():
+        emails.append({'id': msg_id, 'snippet': snippet, 'body': body or "Could not extract plain text body."})
+    return emails
 
 @server.tool()
-def send_email(email_content: EmailContent, ctx: Context) -> Dict[str, str]:
+@google_api_errors('Gmail')
+async def send_email(email_content: EmailContent, ctx: Context) -> Dict[str, str]:
     """
     Sends an email from the user's Gmail account.
 
     Args:
         email_content: A structured object containing the recipient, subject, and body.
     """
-    creds = get_creds_from_context(ctx)
-    try:
-        gmail_service = googleapiclient.discovery.build('gmail', 'v1', credentials=creds)
-        message = EmailMessage()
-        message.set_content(email_content.body)
-        message['To'] = email_content.to
-        message['Subject'] = email_content.subject
-
-        encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
-        create_message = {'raw': encoded_message}
-        
-        send_message = gmail_service.users().messages().send(userId="me", body=create_message).execute()
-        return {"status": "Email sent successfully", "messageId": send_message['id']}
-    except HttpError as e:
-        raise Exception(f"API Gmail error (HTTP {e.status_code}): {e.reason}")
-
+    gmail_service = get_service(ctx, 'gmail', 'v1')
+    message = EmailMessage()
+    message.set_content(email_content.body)
+    message['To'] = email_content.to
+    message['Subject'] = email_content.subject
+
+    # Upload the RFC 822 bytes as-is rather than inlining them base64-encoded in a JSON 'raw' field,
+    # which would hold three copies of the message in memory and send a third more bytes.
+    media = MediaInMemoryUpload(message.as_bytes(), mimetype='message/rfc822', resumable=False)
+
+    send_message = await execute(gmail_service.users().messages().send(userId="me", media_body=media, fields='id'))
+    return {"status": "Email sent successfully", "messageId": send_message['id']}
+
+
+async def collect_senders(gmail_service: Any, message_ids: List[str], senders: Set[str]) -> None:
+    """Fetches the From header of the given messages in a batch and adds their sender addresses to senders."""
+    for msg in await execute_batch(gmail_service, [
+        gmail_service.users().messages().get(userId='me', id=msg_id, format='metadata', metadataHeaders=['From'], fields='payload/headers')
+        for msg_id in message_ids
+    ]):
+        # metadataHeaders=['From'] makes Gmail return only the From header (matched case-insensitively),
+        # so there's no need to scan and lowercase every header name
+        headers = msg.get('payload', {}).get('headers', [])
+        if headers:
+            sender = headers[0]['value']
+            match = FROM_ADDRESS_RE.search(sender)
+            senders.add((match.group(1) if match else sender).strip())
 
 @server.tool()
-def list_gmail_senders(ctx: Context, max_results: int = 100) -> List[str]:
+@google_api_errors('Gmail')
+async def list_gmail_senders(ctx: Context, max_results: int = 100) -> List[str]:
     """
     Lists unique sender email addresses from the user's Gmail inbox.
 
@@ -207,27 +498,46 @@ def list_gmail_senders(ctx: Context, max_results: int = 100) -> List[str]:
     Returns:
         A list of unique sender email addresses.
     """
-    creds = get_creds_from_context(ctx)
-    try:
-        gmail_service = googleapiclient.discovery.build('gmail', 'v1', credentials=creds)
-        messages_list = gmail_service.users().messages().list(userId='me', maxResults=max_results).execute()
-        messages = messages_list.get('messages', [])
-        senders = set()
-        for msg_info in messages:
-            msg = gmail_service.users().messages().get(userId='me', id=msg_info['id'], format='metadata', metadataHeaders=['From']).execute()
-            headers = msg.get('payload', {}).get('headers', [])
-            for header in headers:
-                if header['name'].lower() == 'from':
-                    import re
-                    match = re.search(r'<(.+?)>', header['value'])
-                    email = match.group(1) if match else header['value']
-                    senders.add(email.strip())
-        return list(senders)
-    except HttpError as e:
-        raise Exception(f"API Gmail error (HTTP {e.status_code}): {e.reason}")
+    gmail_service = get_service(ctx, 'gmail', 'v1')
+    senders = set()
+    scanned = 0
+    pending_ids = []
+    # Fetch From headers one batch at a time as ids come in, reporting progress after each batch
+    # so the client can follow a long scan instead of waiting blind for the whole result.
+    async for msg_id in list_message_ids(gmail_service, total=max_results):
+        pending_ids.append(msg_id)
+        if len(pending_ids) == GOOGLE_BATCH_LIMIT:
+            await collect_senders(gmail_service, pending_ids, senders)
+            scanned += len(pending_ids)
+            pending_ids = []
+            await ctx.report_progress(scanned, max_results)
+    if pending_ids:
+        await collect_senders(gmail_service, pending_ids, senders)
+    return list(senders)
+
+async def delete_emails_from_sender(
+    gmail_service: Any, sender_email: str, max_results: int, semaphore: asyncio.Semaphore
+) -> Tuple[List[str], Optional[HttpError]]:
+    """
+    Deletes up to max_results emails from one sender. Returns the ids actually deleted, along with
+    the error that stopped the deletion part way, if any.
+    """
+    deleted_ids = []
+    async with semaphore:
+        try:
+            message_ids = [msg_id async for msg_id in list_message_ids(gmail_service, f'from:{sender_email}', max_results)]
+            # One batchDelete call per chunk of ids instead of one delete round-trip per message
+            for i in range(0, len(message_ids), GMAIL_BATCH_DELETE_LIMIT):
+                chunk = message_ids[i:i + GMAIL_BATCH_DELETE_LIMIT]
+                await execute(gmail_service.users().messages().batchDelete(userId='me', body={'ids': chunk}))
+                deleted_ids.extend(chunk)
+        except HttpError as e:
+            return deleted_ids, e
+    return deleted_ids, None
 
 @server.tool()
-def batch_delete_emails_from_senders(sender_emails: List[str], ctx: Context, max_results: int = 100) -> Dict[str, Any]:
+@google_api_errors('Gmail')
+async def batch_delete_emails_from_senders(sender_emails: List[str], ctx: Context, max_results: int = 100) -> Dict[str, Any]:
     """
     Deletes all emails from the specified sender email addresses.
 
@@ -237,29 +547,51 @@ def batch_delete_emails_from_senders(sender_emails: List[str], ctx: Context, max
     Returns:
         A summary of the deletion.
     """
-    creds = get_creds_from_context(ctx)
-    try:
-        gmail_service = googleapiclient.discovery.build('gmail', 'v1', credentials=creds)
-        total_deleted = 0
-        deleted_details = {}
-        for sender_email in sender_emails:
-            query = f'from:{sender_email}'
-            results = gmail_service.users().messages().list(userId='me', q=query, maxResults=max_results).execute()
-            messages = results.get('messages', [])
-            deleted_ids = []
-            for msg_info in messages:
-                gmail_service.users().messages().delete(userId='me', id=msg_info['id']).execute()
-                deleted_ids.append(msg_info['id'])
+    gmail_service = get_service(ctx, 'gmail', 'v1')
+    # A repeated sender would run two passes over the same messages
+    sender_emails = list(dict.fromkeys(sender_emails))
+    # Senders are independent: purge them concurrently, a few at a time to stay under rate limits.
+    # A failed sender doesn't abort the others, which would keep deleting after the tool had failed;
+    # its error is reported in its place instead, with whatever was deleted before it.
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_SENDERS)
+    results = await asyncio.gather(*(
+        delete_emails_from_sender(gmail_service, sender_email, max_results, semaphore)
+        for sender_email in sender_emails
+    ), return_exceptions=True)
+    deleted_details = {}
+    total_deleted = 0
+    errors = []
+    for sender_email, result in zip(sender_emails, results):
+        if isinstance(result, BaseException):
+            raise result
+        deleted_ids, error = result
+        total_deleted += len(deleted_ids)
+        if error is None:
             deleted_details[sender_email] = deleted_ids
-            total_deleted += len(deleted_ids)
-        return {"status": "Batch delete completed", "total_deleted": total_deleted, "details": deleted_details}
-    except HttpError as e:
-        raise Exception(f"API Gmail error (HTTP {e.status_code}): {e.reason}")
+        else:
+            errors.append(error)
+            deleted_details[sender_email] = {"deleted": deleted_ids, "error": format_api_error('Gmail', error)}
+    if len(errors) == len(sender_emails) and total_deleted == 0:
+        # Every sender failed before deleting anything (e.g. the token lacks the https://mail.google.com/
+        # scope): fail the tool rather than report a batch delete that didn't happen
+        raise errors[0]
+    status = "Batch delete completed with errors" if errors else "Batch delete completed"
+    return {"status": status, "total_deleted": total_deleted, "details": deleted_details}
 
 # --- CALENDAR TOOLS ---
 
+def build_event_body(event_details: EventDetails) -> Dict[str, Any]:
+    """Converts structured event details into a Calendar API event resource."""
+    return {
+        'summary': event_details.summary,
+        'description': event_details.description or DEFAULT_EVENT_DESCRIPTION,
+        'start': {'dateTime': event_details.start_time, 'timeZone': CALENDAR_TIMEZONE},
+        'end': {'dateTime': event_details.end_time, 'timeZone': CALENDAR_TIMEZONE},
+    }
+
 @server.tool()
-def list_calendar_events(ctx: Context, start_time: str, end_time: str, query: Optional[str] = None) -> List[ListedEvent]:
+@google_api_errors('Calendar')
+async def list_calendar_events(ctx: Context, start_time: str, end_time: str, query: Optional[str] = None) -> List[ListedEvent]:
     """
     Lists calendar events within a specified time range, optionally filtering by a search query.
 
@@ -268,81 +600,91 @@ def list_calendar_events(ctx: Context, start_time: str, end_time: str, query: Op
         end_time: The end of the time range in ISO 8601 format (e.g., '2025-07-06T00:00:00Z').
         query: An optional text query to filter events by (e.g., 'meeting').
     """
-    creds = get_creds_from_context(ctx)
-    try:
-        calendar_service = googleapiclient.discovery.build('calendar', 'v3', credentials=creds)
-        events_result = calendar_service.events().list(
-            calendarId='primary', 
-            timeMin=start_time, 
-            timeMax=end_time,
-            q=query, # TODO: study it
-            maxResults=20,  # Limit results to a reasonable number
-            singleEvents=True, 
-            orderBy='startTime'
-        ).execute()
-        
-        events = events_result.get('items', [])
-        if not events:
-            return []
-
-        listed_events = []
-        for event in events:
-            # Handle all-day events which have 'date' instead of 'dateTime'
-            start = event['start'].get('dateTime', event['start'].get('date'))
-            end = event['end'].get('dateTime', event['end'].get('date'))
-            listed_events.append(
-                ListedEvent(
-                    id=event['id'],
-                    summary=event.get('summary', 'No Title'),
-                    start_time=start,
-                    end_time=end
-                )
+    calendar_service = get_service(ctx, 'calendar', 'v3')
+    events_result = await execute(calendar_service.events().list(
+        calendarId='primary', 
+        timeMin=start_time, 
+        timeMax=end_time,
+        q=query, # TODO: study it
+        maxResults=20,  # Limit results to a reasonable number
+        singleEvents=True, 
+        orderBy='startTime',
+        fields='items(id,summary,start,end)'
+    ))
+
+    events = events_result.get('items', [])
+    if not events:
+        return []
+
+    listed_events = []
+    for event in events:
+        # Handle all-day events which have 'date' instead of 'dateTime'
+        start = event['start'].get('dateTime', event['start'].get('date'))
+        end = event['end'].get('dateTime', event['end'].get('date'))
+        listed_events.append(
+            ListedEvent(
+                id=event['id'],
+                summary=event.get('summary', 'No Title'),
+                start_time=start,
+                end_time=end
             )
-        return listed_events
-    except HttpError as e:
-        raise Exception(f"API Calendar error (HTTP {e.status_code}): {e.reason}")
+        )
+    return listed_events
 
 @server.tool()
-def create_calendar_event(event_details: EventDetails, ctx: Context) -> Dict[str, Any]:
+@google_api_errors('Calendar')
+async def create_calendar_event(event_details: EventDetails, ctx: Context) -> Dict[str, Any]:
     """
     Creates a Google Calendar event from structured event details.
     
     Args:
         event_details: A structured object containing the summary, start time, end time, and description.
     """
-    creds = get_creds_from_context(ctx)
-    event_body = {
-        'summary': event_details.summary,
-        'description': event_details.description or f'Created from an email automation.',
-        'start': {'dateTime': event_details.start_time, 'timeZone': 'Europe/Rome'},
-        'end': {'dateTime': event_details.end_time, 'timeZone': 'Europe/Rome'},
-    }
+    calendar_service = get_service(ctx, 'calendar', 'v3')
+    event_body = build_event_body(event_details)
 
-    try:
-        calendar_service = googleapiclient.discovery.build('calendar', 'v3', credentials=creds)
-        created_event = calendar_service.events().insert(calendarId='primary', body=event_body).execute()
-        return created_event
-    except HttpError as e:
-        raise Exception(f"API Calendar error (HTTP {e.status_code}): {e.reason}")
+    created_event = await execute(calendar_service.events().insert(calendarId='primary', body=event_body))
+    return created_event
 
 @server.tool()
-def delete_calendar_event(event_id: str, ctx: Context) -> Dict[str, str]:
+@google_api_errors('Calendar')
+async def create_calendar_events(events: List[EventDetails], ctx: Context) -> List[Dict[str, Any]]:
+    """
+    Creates several Google Calendar events at once, sending them together in batch requests.
+    Prefer it over repeated create_calendar_event calls when creating more than one event.
+
+    Args:
+        events: A list of structured objects, each containing the summary, start time, end time, and description.
+    Returns:
+        The created events, in the same order. An event that could not be created is replaced by an object
+        with an 'error' field, so the other events are still reported.
+    """
+    calendar_service = get_service(ctx, 'calendar', 'v3')
+    results = await execute_batch(calendar_service, [
+        calendar_service.events().insert(calendarId='primary', body=build_event_body(event_details))
+        for event_details in events
+    ], return_exceptions=True)
+    return [
+        {"error": format_api_error('Calendar', result)} if isinstance(result, HttpError) else result
+        for result in results
+    ]
+
+@server.tool()
+@google_api_errors('Calendar')
+async def delete_calendar_event(event_id: str, ctx: Context) -> Dict[str, str]:
     """
     Deletes a calendar event by its ID. To get an event ID, first list or search for events.
 
     Args:
         event_id: The unique ID of the event to delete.
     """
-    creds = get_creds_from_context(ctx)
-    try:
-        calendar_service = googleapiclient.discovery.build('calendar', 'v3', credentials=creds)
-        calendar_service.events().delete(calendarId='primary', eventId=event_id).execute()
-        return {"status": "Event deleted successfully"}
-    except HttpError as e:
-        raise Exception(f"API Calendar error (HTTP {e.status_code}): {e.reason}")
+    calendar_service = get_service(ctx, 'calendar', 'v3')
+    await execute(calendar_service.events().delete(calendarId='primary', eventId=event_id))
+    return {"status": "Event deleted successfully"}
 
 @server.tool()
-def update_calendar_event(event_id: str, update_details: EventUpdateDetails, ctx: Context) -> Dict[str, Any]:
+@google_api_errors('Calendar')
+async def update_calendar_event(event_id: str, update_details: EventUpdateDetails, ctx: Context) -> Dict[str, Any]:
     """
     Updates an existing calendar event by its ID. Only provided fields will be updated.
 
@@ -350,32 +692,29 @@ def update_calendar_event(event_id: str, update_details: EventUpdateDetails, ctx
         event_id: The ID of the event to update.
         update_details: A structured object with the fields to update.
     """
-    creds = get_creds_from_context(ctx)
-    try:
-        calendar_service = googleapiclient.discovery.build('calendar', 'v3', credentials=creds)
-        # First, get the existing event to ensure it exists and to merge updates
-        event = calendar_service.events().get(calendarId='primary', eventId=event_id).execute()
-
-        # Create the update body with only the fields that are provided
-        update_body = update_details.model_dump(exclude_unset=True)
-        if 'start_time' in update_body:
-            event['start']['dateTime'] = update_body['start_time']
-        if 'end_time' in update_body:
-            event['end']['dateTime'] = update_body['end_time']
-        if 'summary' in update_body:
-            event['summary'] = update_body['summary']
-        if 'description' in update_body:
-            event['description'] = update_body['description']
-            
-        updated_event = calendar_service.events().update(calendarId='primary', eventId=event['id'], body=event).execute()
-        return updated_event
-    except HttpError as e:
-        raise Exception(f"API Calendar error (HTTP {e.status_code}): {e.reason}")
+    calendar_service = get_service(ctx, 'calendar', 'v3')
+    # Build a partial body with only the fields that are provided; patch() merges it server-side,
+    # so there's no need to fetch the event first. Nested objects are merged too, which keeps
+    # the event's existing timeZone when only a time changes.
+    update_body = update_details.model_dump(exclude_unset=True)
+    patch_body = {}
+    if 'start_time' in update_body:
+        patch_body['start'] = {'dateTime': update_body['start_time']}
+    if 'end_time' in update_body:
+        patch_body['end'] = {'dateTime': update_body['end_time']}
+    if 'summary' in update_body:
+        patch_body['summary'] = update_body['summary']
+    if 'description' in update_body:
+        patch_body['description'] = update_body['description']
+
+    updated_event = await execute(calendar_service.events().patch(calendarId='primary', eventId=event_id, body=patch_body))
+    return updated_event
 
 # --- GOOGLE DRIVE TOOLS ---
 
 @server.tool()
-def list_drive_files(query: str, ctx: Context) -> List[ListedDriveFile]:
+@google_api_errors('Drive')
+async def list_drive_files(query: str, ctx: Context) -> List[ListedDriveFile]:
     """
     Searches for files in Google Drive using a query string.
 
@@ -383,33 +722,30 @@ def list_drive_files(query: str, ctx: Context) -> List[ListedDriveFile]:
         query: The search query. Examples: "name contains 'report'", "mimeType='application/vnd.google-apps.spreadsheet'".
                See Google Drive API docs for full query syntax.
     """
-    creds = get_creds_from_context(ctx)
-    try:
-        drive_service = googleapiclient.discovery.build('drive', 'v3', credentials=creds)
-        
-        # TODO: Considering adding https://developers.google.com/workspace/drive/api/guides/search-files as a guide for q parameter
-        results = drive_service.files().list(
-            q=query,
-            pageSize=20, # Limit results
-            fields="nextPageToken, files(id, name, mimeType)"
-        ).execute()
-        
-        files = results.get('files', [])
-        if not files:
-            return []
-            
-        return [
-            ListedDriveFile(
-                id=file['id'],
-                name=file['name'],
-                mime_type=file['mimeType']
-            ) for file in files
-        ]
-    except HttpError as e:
-        raise Exception(f"API Drive error (HTTP {e.status_code}): {e.reason}")
+    drive_service = get_service(ctx, 'drive', 'v3')
+
+    # TODO: Considering adding https://developers.google.com/workspace/drive/api/guides/search-files as a guide for q parameter
+    results = await execute(drive_service.files().list(
+        q=query,
+        pageSize=20, # Limit results
+        fields="files(id, name, mimeType)"
+    ))
+
+    files = results.get('files', [])
+    if not files:
+        return []
+
+    return [
+        ListedDriveFile(
+            id=file['id'],
+            name=file['name'],
+            mime_type=file['mimeType']
+        ) for file in files
+    ]
 
 @server.tool()
-def create_drive_document(ctx: Context, title: str, content: Optional[str] = "") -> Dict[str, str]:
+@google_api_errors('Drive')
+async def create_drive_document(ctx: Context, title: str, content: Optional[str] = "") -> Dict[str, str]:
     """
     Creates a new Google Document in the user's Drive with the given title and content.
 
@@ -417,22 +753,19 @@ def create_drive_document(ctx: Context, title: str, content: Optional[str] = "")
         title: The title of the new document.
         content: The initial text content for the document.
     """
-    creds = get_creds_from_context(ctx)
-    try:
-        drive_service = googleapiclient.discovery.build('drive', 'v3', credentials=creds)
-        file_metadata = {
-            'name': title,
-            'mimeType': 'application/vnd.google-apps.document'
-        }
-        
-        media = MediaIoBaseUpload(io.BytesIO((content or "").encode()), mimetype='text/plain', resumable=True)
-        file = drive_service.files().create(body=file_metadata, media_body=media, fields='id,name,webViewLink').execute()
-        return {"status": "Document created", "id": file['id'], "name": file['name'], "link": file['webViewLink']}
-    except HttpError as e:
-        raise Exception(f"API Drive error (HTTP {e.status_code}): {e.reason}")
+    drive_service = get_service(ctx, 'drive', 'v3')
+    file_metadata = {
+        'name': title,
+        'mimeType': 'application/vnd.google-apps.document'
+    }
+
+    media = text_media_upload(content or "")
+    file = await execute(drive_service.files().create(body=file_metadata, media_body=media, fields='id,name,webViewLink'))
+    return {"status": "Document created", "id": file['id'], "name": file['name'], "link": file['webViewLink']}
 
 @server.tool()
-def update_drive_document(file_id: str, content: str, ctx: Context) -> Dict[str, str]:
+@google_api_errors('Drive')
+async def update_drive_document(file_id: str, content: str, ctx: Context) -> Dict[str, str]:
     """
     Overwrites the content of an existing Google Document.
 
@@ -440,51 +773,41 @@ def update_drive_document(file_id: str, content: str, ctx: Context) -> Dict[str,
         file_id: The ID of the document to update.
         content: The new text content to write to the document.
     """
-    creds = get_creds_from_context(ctx)
-    try:
-        drive_service = googleapiclient.discovery.build('drive', 'v3', credentials=creds)
-        media = MediaIoBaseUpload(io.BytesIO(content.encode()), mimetype='text/plain', resumable=True)
-        updated_file = drive_service.files().update(fileId=file_id, media_body=media, fields='id,name').execute()
-        return {"status": "Document updated", "id": updated_file['id'], "name": updated_file['name']}
-    except HttpError as e:
-        raise Exception(f"API Drive error (HTTP {e.status_code}): {e.reason}")
+    drive_service = get_service(ctx, 'drive', 'v3')
+    media = text_media_upload(content)
+    updated_file = await execute(drive_service.files().update(fileId=file_id, media_body=media, fields='id,name'))
+    return {"status": "Document updated", "id": updated_file['id'], "name": updated_file['name']}
 
 # Dangerous. Use with caution.
 @server.tool()
-def delete_drive_file(file_id: str, ctx: Context) -> Dict[str, str]:
+@google_api_errors('Drive')
+async def delete_drive_file(file_id: str, ctx: Context) -> Dict[str, str]:
     """
     Permanently deletes a file from Google Drive. This action cannot be undone.
 
     Args:
         file_id: The ID of the file to delete.
     """
-    creds = get_creds_from_context(ctx)
-    try:
-        drive_service = googleapiclient.discovery.build('drive', 'v3', credentials=creds)
-        drive_service.files().delete(fileId=file_id).execute()
-        return {"status": f"File with ID '{file_id}' deleted successfully."}
-    except HttpError as e:
-        raise Exception(f"API Drive error (HTTP {e.status_code}): {e.reason}")
+    drive_service = get_service(ctx, 'drive', 'v3')
+    await execute(drive_service.files().delete(fileId=file_id))
+    return {"status": f"File with ID '{file_id}' deleted successfully."}
 
 @server.tool()
-def move_drive_file_to_bin(file_id: str, ctx: Context) -> Dict[str, str]:
+@google_api_errors('Drive')
+async def move_drive_file_to_bin(file_id: str, ctx: Context) -> Dict[str, str]:
     """
     Moves a file to the Google Drive bin (trash). The file can be restored from the bin later.
 
     Args:
         file_id: The ID of the file to move to the bin.
     """
-    creds = get_creds_from_context(ctx)
-    try:
-        drive_service = googleapiclient.discovery.build('drive', 'v3', credentials=creds)
-        
-        # To move a file to the bin, we update its metadata to set 'trashed' to True.
-        body = {'trashed': True}
-        drive_service.files().update(fileId=file_id, body=body).execute()
-        
-        return {"status": f"File with ID '{file_id}' moved to bin successfully."}
-    except HttpError as e:
-        raise Exception(f"API Drive error (HTTP {e.status_code}): {e.reason}")
+    drive_service = get_service(ctx, 'drive', 'v3')
+
+    # To move a file to the bin, we update its metadata to set 'trashed' to True.
+    body = {'trashed': True}
+    await execute(drive_service.files().update(fileId=file_id, body=body, fields='id'))
+
+    return {"status": f"File with ID '{file_id}' moved to bin successfully."}
 
 if __name__ == "__main__":
     server.run()
\ No newline at end of file